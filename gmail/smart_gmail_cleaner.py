@@ -28,16 +28,35 @@ import os
 import pickle
 import re
 import time
-from datetime import datetime, timedelta
-from collections import defaultdict
+from array import array
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import compress
 from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.http import build_http
+import httplib2
 import base64
 
 # Gmail API scopes
 SCOPES = ['https://www.googleapis.com/auth/gmail.modify']
 
+# Max calls per batch HTTP request (Gmail API limit is 100)
+BATCH_SIZE = 100
+
+# Max message IDs per batchModify/batchDelete call (Gmail API limit is 1000)
+MODIFY_BATCH_SIZE = 1000
+
+# Retries (with exponential backoff) for rate-limited or failed API calls
+MAX_RETRIES = 5
+RETRY_STATUSES = (429, 500, 503)
+
 # Marketing/spam indicators
 MARKETING_KEYWORDS = [
     'unsubscribe', 'opt-out', 'opt out', 'email preferences', 'manage preferences',
@@ -67,9 +86,51 @@ KNOWN_MARKETING_DOMAINS = [
     'youtube.com', 'tiktok.com', 'instagram.com', 'snapchat.com'
 ]
 
+# Marketing signals as bit flags. The marketing score only depends on which
+# signals an email has, so it is precomputed for every combination.
+SIGNAL_PROMOTIONS = 1
+SIGNAL_SOCIAL = 2
+SIGNAL_SENDER_PATTERN = 4
+SIGNAL_KNOWN_DOMAIN = 8
+SIGNAL_KEYWORD = 16
+SIGNAL_KEYWORDS = 32
+SIGNAL_UNSUBSCRIBE = 64
+
+# Cleanup categories as bit flags, set per sender by categorize_senders
+FLAG_PROMOTIONAL = 1
+FLAG_MARKETING = 2
+FLAG_NEVER_OPENED = 4
+FLAG_RARELY_OPENED = 8
+FLAG_OLD_UNREAD = 16
+FLAG_BULK_SENDERS = 32
+
+CATEGORY_FLAGS = (
+    (FLAG_PROMOTIONAL, "promotional"),
+    (FLAG_MARKETING, "marketing"),
+    (FLAG_NEVER_OPENED, "never_opened"),
+    (FLAG_RARELY_OPENED, "rarely_opened"),
+    (FLAG_OLD_UNREAD, "old_unread"),
+    (FLAG_BULK_SENDERS, "bulk_senders")
+)
+
+_ANGLE_RE = re.compile(r'<([^>]+)>')
+
+_SENDER_PATTERN_RE = re.compile('|'.join(re.escape(p) for p in MARKETING_SENDER_PATTERNS))
+
+_KNOWN_DOMAINS = frozenset(KNOWN_MARKETING_DOMAINS)
+
+# All keywords in one pattern so each email's text is scanned once. The
+# lookahead lets matches overlap, so every keyword present is reported.
+_KEYWORD_RE = re.compile(
+    '(?=(' + '|'.join(re.escape(k) for k in sorted(MARKETING_KEYWORDS, key=len, reverse=True)) + '))'
+)
+
 
 def authenticate():
-    """Authenticate with Gmail API."""
+    """Authenticate with Gmail API.
+    
+    Returns (service, creds), or (None, None) if there are no credentials.
+    """
     creds = None
     
     # Check for cached credentials
@@ -96,7 +157,7 @@ def authenticate():
                 print("5. Download and rename to 'credentials.json'")
                 print("6. Place in same folder as this script")
                 print("\nSee full instructions at top of this script.")
-                return None
+                return None, None
             
             print("\nOpening browser for Google sign-in...")
             flow = InstalledAppFlow.from_client_secrets_file('credentials.json', SCOPES)
@@ -107,26 +168,36 @@ def authenticate():
             pickle.dump(creds, token)
     
     print("✓ Authenticated with Gmail")
-    return build('gmail', 'v1', credentials=creds)
+    return build('gmail', 'v1', credentials=creds), creds
 
 
 def get_email_header(headers, name):
     """Extract a specific header value."""
+    name = name.lower()
     for header in headers:
-        if header['name'].lower() == name.lower():
+        if header['name'].lower() == name:
             return header['value']
     return ""
 
 
+def parse_date(date_str):
+    """Parse a Date header into epoch seconds (0 if it can't be parsed)."""
+    try:
+        return int(parsedate_to_datetime(date_str).timestamp())
+    except Exception:
+        return 0
+
+
+@lru_cache(maxsize=4096)
 def parse_sender(from_header):
     """Parse sender email and name from From header."""
     if not from_header:
         return "unknown", "unknown"
     
-    match = re.search(r'<([^>]+)>', from_header)
+    match = _ANGLE_RE.search(from_header)
     if match:
         email = match.group(1).lower()
-        name = from_header.replace(f'<{match.group(1)}>', '').strip().strip('"')
+        name = (from_header[:match.start()] + from_header[match.end():]).strip().strip('"')
         return email, name if name else email
     
     if '@' in from_header:
@@ -135,178 +206,349 @@ def parse_sender(from_header):
     return from_header, from_header
 
 
-def fetch_emails(service, max_emails=5000, query=""):
+def fetch_emails(service, creds, max_emails=5000, query=""):
     """Fetch emails from Gmail."""
     emails = []
-    page_token = None
+    retry_ids = []
     
     print(f"\nFetching emails{' matching: ' + query if query else ''}...")
     start_time = time.time()
     
-    while len(emails) < max_emails:
-        try:
-            results = service.users().messages().list(
-                userId='me',
-                maxResults=min(500, max_emails - len(emails)),
-                pageToken=page_token,
-                q=query if query else None
-            ).execute()
-            
-            messages = results.get('messages', [])
-            
-            if not messages:
-                break
-            
-            # Fetch details for each message
-            for msg in messages:
-                try:
-                    msg_data = service.users().messages().get(
-                        userId='me',
-                        id=msg['id'],
-                        format='metadata',
-                        metadataHeaders=['From', 'Subject', 'Date']
-                    ).execute()
-                    
-                    headers = msg_data.get('payload', {}).get('headers', [])
+    def store_message(request_id, msg_data, exception):
+        """Batch callback: store the metadata of one fetched message."""
+        if exception is not None:
+            if isinstance(exception, HttpError) and exception.resp.status in RETRY_STATUSES:
+                retry_ids.append(request_id)
+            return
+        
+        headers = msg_data.get('payload', {}).get('headers', [])
+        subject = get_email_header(headers, 'Subject')
+        snippet = msg_data.get('snippet', '')
+        date_str = get_email_header(headers, 'Date')
+        labels = frozenset(msg_data.get('labelIds', []))
+        
+        emails.append({
+            'id': msg_data['id'],
+            'threadId': msg_data.get('threadId'),
+            'from': get_email_header(headers, 'From'),
+            'subject': subject,
+            'subject_lc': subject.lower(),
+            'date': date_str,
+            'ts': parse_date(date_str),
+            'snippet': snippet,
+            'snippet_lc': snippet.lower(),
+            'labelIds': labels,
+            'isRead': 'UNREAD' not in labels
+        })
+        
+        if len(emails) % 200 == 0:
+            elapsed = time.time() - start_time
+            print(f"  {len(emails)} emails fetched... ({elapsed:.0f}s)")
+    
+    def list_request(page_token, max_results):
+        return service.users().messages().list(
+            userId='me',
+            maxResults=min(500, max_results),
+            pageToken=page_token,
+            q=query if query else None,
+            fields='nextPageToken,messages/id'
+        )
+    
+    # httplib2 connections are not thread-safe, so list() pages are
+    # prefetched on their own connection while batches use the service's
+    list_http = AuthorizedHttp(creds, http=build_http())
+    
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        next_page = executor.submit(
+            list_request(None, max_emails).execute, http=list_http, num_retries=MAX_RETRIES
+        )
+        
+        while next_page is not None:
+            try:
+                results = next_page.result()
+                next_page = None
+                
+                messages = results.get('messages', [])
+                
+                if not messages:
+                    break
+                
+                # Start listing the next page while this page's details download
+                page_token = results.get('nextPageToken')
+                remaining = max_emails - len(emails) - len(messages)
+                if page_token and remaining > 0:
+                    next_page = executor.submit(
+                        list_request(page_token, remaining).execute,
+                        http=list_http, num_retries=MAX_RETRIES
+                    )
+                
+                # Fetch details in batches (one HTTP round trip per BATCH_SIZE messages).
+                # Rate-limited messages are queued again after a backoff.
+                pending = [msg['id'] for msg in messages]
+                for attempt in range(MAX_RETRIES + 1):
+                    if attempt:
+                        time.sleep(2 ** attempt)
                     
-                    emails.append({
-                        'id': msg['id'],
-                        'threadId': msg.get('threadId'),
-                        'from': get_email_header(headers, 'From'),
-                        'subject': get_email_header(headers, 'Subject'),
-                        'date': get_email_header(headers, 'Date'),
-                        'snippet': msg_data.get('snippet', ''),
-                        'labelIds': msg_data.get('labelIds', []),
-                        'isRead': 'UNREAD' not in msg_data.get('labelIds', [])
-                    })
+                    del retry_ids[:]
+                    for i in range(0, len(pending), BATCH_SIZE):
+                        chunk = pending[i:i + BATCH_SIZE]
+                        stored_before, retry_before = len(emails), len(retry_ids)
+                        batch = service.new_batch_http_request(callback=store_message)
+                        for msg_id in chunk:
+                            batch.add(service.users().messages().get(
+                                userId='me',
+                                id=msg_id,
+                                format='metadata',
+                                metadataHeaders=['From', 'Subject', 'Date'],
+                                fields='id,threadId,labelIds,snippet,payload/headers'
+                            ), request_id=msg_id)
+                        try:
+                            batch.execute()
+                        except (HttpError, httplib2.HttpLib2Error, OSError) as e:
+                            stored = {email['id'] for email in emails[stored_before:]}
+                            unstored = [msg_id for msg_id in chunk if msg_id not in stored]
+                            if isinstance(e, HttpError) and e.resp.status not in RETRY_STATUSES:
+                                # Not worth retrying (e.g. 401/403), so drop these
+                                # like the callback drops a failed message
+                                print(f"  Batch error ({e}), skipping {len(unstored)} emails")
+                                continue
+                            # The batch request itself failed: queue every message
+                            # in it that wasn't stored for the next attempt
+                            print(f"  Batch error ({e}), retrying...")
+                            del retry_ids[retry_before:]
+                            retry_ids.extend(unstored)
                     
-                except Exception as e:
-                    continue
+                    if not retry_ids:
+                        break
+                    pending = list(retry_ids)
                 
-                if len(emails) % 200 == 0:
-                    elapsed = time.time() - start_time
-                    print(f"  {len(emails)} emails fetched... ({elapsed:.0f}s)")
-            
-            page_token = results.get('nextPageToken')
-            if not page_token:
+            except Exception as e:
+                print(f"  Error: {e}")
                 break
-                
-            # Small delay to avoid rate limiting
-            time.sleep(0.1)
-            
-        except Exception as e:
-            print(f"  Error: {e}")
-            break
     
     elapsed = time.time() - start_time
     print(f"✓ Fetched {len(emails)} emails in {elapsed:.0f} seconds")
     return emails
 
 
-def is_marketing_email(email):
-    """Check if email appears to be marketing/promotional."""
-    subject = (email.get("subject") or "").lower()
-    snippet = (email.get("snippet") or "").lower()
-    sender_email, sender_name = parse_sender(email.get("from", ""))
-    sender_name = sender_name.lower()
+def score_signals(signals):
+    """Compute the marketing score for a combination of signal flags."""
+    if signals & SIGNAL_PROMOTIONS:
+        return 5
     
-    # Check if Gmail already categorized it as promotional
-    labels = email.get('labelIds', [])
-    if 'CATEGORY_PROMOTIONS' in labels:
-        return True, 5, ["Gmail marked as Promotions"]
-    
-    if 'CATEGORY_SOCIAL' in labels:
-        return True, 4, ["Gmail marked as Social"]
+    if signals & SIGNAL_SOCIAL:
+        return 4
     
     score = 0
+    if signals & SIGNAL_SENDER_PATTERN:
+        score += 2
+    if signals & SIGNAL_KNOWN_DOMAIN:
+        score += 3
+    if signals & SIGNAL_KEYWORDS:
+        score += 4
+    elif signals & SIGNAL_KEYWORD:
+        score += 2
+    if signals & SIGNAL_UNSUBSCRIBE:
+        score += 3
+    return score
+
+
+SIGNAL_SCORES = [score_signals(signals) for signals in range(SIGNAL_UNSUBSCRIBE * 2)]
+
+
+def label_signals(labels):
+    """Find the marketing signals in Gmail's category labels."""
+    signals = 0
+    if 'CATEGORY_PROMOTIONS' in labels:
+        signals |= SIGNAL_PROMOTIONS
+    if 'CATEGORY_SOCIAL' in labels:
+        signals |= SIGNAL_SOCIAL
+    return signals
+
+
+def sender_signals(sender_email, sender_name):
+    """Find the sender-based marketing signals (patterns and domains)."""
+    sender_name = sender_name.lower()
+    signals = 0
     reasons = []
     
     # Check sender patterns
-    for pattern in MARKETING_SENDER_PATTERNS:
-        if pattern in sender_email or pattern in sender_name:
-            score += 2
-            reasons.append(f"sender pattern: {pattern}")
-            break
-    
-    # Check known marketing domains
-    for domain in KNOWN_MARKETING_DOMAINS:
-        if domain in sender_email:
-            score += 3
+    match = _SENDER_PATTERN_RE.search(sender_email) or _SENDER_PATTERN_RE.search(sender_name)
+    if match:
+        signals |= SIGNAL_SENDER_PATTERN
+        reasons.append(f"sender pattern: {match.group(0)}")
+    
+    # Check known marketing domains (the sender's domain or a parent of it)
+    parts = sender_email.rsplit('@', 1)[-1].split('.')
+    for i in range(len(parts) - 1):
+        domain = '.'.join(parts[i:])
+        if domain in _KNOWN_DOMAINS:
+            signals |= SIGNAL_KNOWN_DOMAIN
             reasons.append(f"known marketing domain: {domain}")
             break
     
-    # Check for marketing keywords
-    text = subject + " " + snippet
-    keyword_matches = 0
-    for keyword in MARKETING_KEYWORDS:
-        if keyword in text:
-            keyword_matches += 1
+    return signals, reasons
+
+
+def text_signals(text):
+    """Find the keyword-based marketing signals in lowercased subject + snippet."""
+    signals = 0
     
+    # Check for marketing keywords
+    keyword_matches = len(set(_KEYWORD_RE.findall(text)))
     if keyword_matches >= 3:
-        score += 4
-        reasons.append(f"{keyword_matches} marketing keywords")
+        signals |= SIGNAL_KEYWORDS
     elif keyword_matches >= 1:
-        score += 2
-        reasons.append(f"{keyword_matches} marketing keyword(s)")
+        signals |= SIGNAL_KEYWORD
     
     # Check for unsubscribe
     if 'unsubscribe' in text:
-        score += 3
+        signals |= SIGNAL_UNSUBSCRIBE
+    
+    return signals, keyword_matches
+
+
+def is_marketing_email(email):
+    """Check if email appears to be marketing/promotional."""
+    # Check if Gmail already categorized it as promotional
+    labels = email.get('labelIds', [])
+    if 'CATEGORY_PROMOTIONS' in labels:
+        return True, SIGNAL_SCORES[SIGNAL_PROMOTIONS], ["Gmail marked as Promotions"]
+    
+    if 'CATEGORY_SOCIAL' in labels:
+        return True, SIGNAL_SCORES[SIGNAL_SOCIAL], ["Gmail marked as Social"]
+    
+    sender_email, sender_name = parse_sender(email.get("from", ""))
+    signals, reasons = sender_signals(sender_email, sender_name)
+    
+    found, keyword_matches = text_signals(email["subject_lc"] + " " + email["snippet_lc"])
+    signals |= found
+    
+    if found & SIGNAL_KEYWORDS:
+        reasons.append(f"{keyword_matches} marketing keywords")
+    elif found & SIGNAL_KEYWORD:
+        reasons.append(f"{keyword_matches} marketing keyword(s)")
+    
+    if found & SIGNAL_UNSUBSCRIBE:
         reasons.append("contains 'unsubscribe'")
     
+    score = SIGNAL_SCORES[signals]
     return score >= 3, score, reasons
 
 
+class SenderStats:
+    """Counters and per-email columns for one sender."""
+    
+    __slots__ = (
+        'name', 'total', 'unread', 'read', 'read_rate', 'marketing_score',
+        'is_promotional', 'oldest', 'newest', 'ids', 'ts', 'unread_mask',
+        'flags', 'old_unread_ids'
+    )
+    
+    def __init__(self, name=""):
+        self.name = name
+        self.total = 0
+        self.unread = 0
+        self.read = 0
+        self.read_rate = 0.0
+        self.marketing_score = 0
+        self.is_promotional = False
+        self.oldest = 0
+        self.newest = 0
+        self.ids = ()
+        self.ts = ()
+        self.unread_mask = b""
+        self.flags = 0
+        self.old_unread_ids = ()
+
+
 def analyze_emails(emails):
     """Analyze all emails and categorize them."""
     print("\nAnalyzing emails...")
     
-    sender_stats = defaultdict(lambda: {
-        "total": 0,
-        "unread": 0,
-        "read": 0,
-        "marketing_score": 0,
-        "emails": [],
-        "name": "",
-        "oldest": None,
-        "newest": None,
-        "read_rate": 0,
-        "is_promotional": False
-    })
+    sender_stats = defaultdict(SenderStats)
+    
+    # Sender-based signals only depend on the From header, so work them
+    # out once per distinct header
+    sender_cache = {}
+    senders = []
     
     for email in emails:
-        sender_email, sender_name = parse_sender(email.get("from", ""))
-        is_read = email.get("isRead", False)
-        
-        # Check if marketing
-        is_marketing, marketing_score, _ = is_marketing_email(email)
-        
-        stats = sender_stats[sender_email]
-        stats["total"] += 1
-        stats["name"] = sender_name
-        stats["emails"].append(email)
-        stats["marketing_score"] = max(stats["marketing_score"], marketing_score)
+        from_header = email.get("from", "")
+        sender = sender_cache.get(from_header)
+        if sender is None:
+            sender_email, sender_name = parse_sender(from_header)
+            sender = (sender_email, sender_name) + sender_signals(sender_email, sender_name)
+            sender_cache[from_header] = sender
+        senders.append(sender)
+    
+    # Marketing signal flags per email; scoring is then a table lookup.
+    # A Promotions/Social label alone decides the score, so those emails
+    # skip the sender and keyword checks.
+    signals = []
+    for email, sender in zip(emails, senders):
+        flags = label_signals(email.get('labelIds', []))
+        if not flags:
+            flags = sender[2] | text_signals(email["subject_lc"] + " " + email["snippet_lc"])[0]
+        signals.append(flags)
+    
+    # Per-email columns, aggregated per sender with C-level counting
+    addrs = [sender[0] for sender in senders]
+    read_flags = [email.get("isRead", False) for email in emails]
+    promo_flags = [flags & SIGNAL_PROMOTIONS for flags in signals]
+    marketing_scores = [SIGNAL_SCORES[flags] for flags in signals]
+    
+    totals = Counter(addrs)
+    reads = Counter(compress(addrs, read_flags))
+    promotional = set(compress(addrs, promo_flags))
+    
+    # Lay each sender's emails out contiguously in preallocated columns
+    # (a counting sort by sender) rather than growing per-sender lists
+    ids = [None] * len(emails)
+    ts_column = array('q', [0]) * len(emails)
+    unread_column = bytearray(len(emails))
+    next_slot = {}
+    start = 0
+    for addr, count in totals.items():
+        next_slot[addr] = start
+        start += count
+    
+    for email, addr, sender, marketing_score in zip(emails, addrs, senders, marketing_scores):
+        i = next_slot[addr]
+        next_slot[addr] = i + 1
+        ids[i] = email["id"]
+        ts_column[i] = email["ts"]
+        unread_column[i] = not email.get("isRead", False)
         
-        if 'CATEGORY_PROMOTIONS' in email.get('labelIds', []):
-            stats["is_promotional"] = True
+        stats = sender_stats[addr]
+        stats.name = sender[1]
+        if marketing_score > stats.marketing_score:
+            stats.marketing_score = marketing_score
         
-        if is_read:
-            stats["read"] += 1
-        else:
-            stats["unread"] += 1
-        
-        # Track dates
-        date_str = email.get("date", "")
-        if date_str:
-            if not stats["oldest"] or date_str < stats["oldest"]:
-                stats["oldest"] = date_str
-            if not stats["newest"] or date_str > stats["newest"]:
-                stats["newest"] = date_str
-    
-    # Calculate read rates
+        # Track dates (epoch seconds, 0 when unknown)
+        ts = email["ts"]
+        if ts:
+            if not stats.oldest or ts < stats.oldest:
+                stats.oldest = ts
+            if ts > stats.newest:
+                stats.newest = ts
+    
+    # Fill in counts, read rates and each sender's slice of the columns
+    ts_view = memoryview(ts_column)
+    unread_view = memoryview(unread_column)
+    
     for addr, stats in sender_stats.items():
-        if stats["total"] > 0:
-            stats["read_rate"] = stats["read"] / stats["total"]
+        end = next_slot[addr]
+        start = end - totals[addr]
+        stats.ids = ids[start:end]
+        stats.ts = ts_view[start:end]
+        stats.unread_mask = unread_view[start:end]
+        
+        stats.total = totals[addr]
+        stats.read = reads[addr]
+        stats.unread = stats.total - stats.read
+        stats.is_promotional = addr in promotional
+        stats.read_rate = stats.read / stats.total
     
     return sender_stats
 
@@ -353,65 +595,62 @@ def categorize_senders(sender_stats):
         }
     }
     
-    now = datetime.utcnow()
-    thirty_days_ago = now - timedelta(days=30)
+    now = datetime.now(timezone.utc)
+    thirty_days_ago = int((now - timedelta(days=30)).timestamp())
     
     for addr, stats in sender_stats.items():
+        flags = 0
+        
         # Gmail Promotions category
-        if stats["is_promotional"]:
-            categories["promotional"]["senders"].append((addr, stats))
-            categories["promotional"]["email_count"] += stats["total"]
+        if stats.is_promotional:
+            flags |= FLAG_PROMOTIONAL
         
         # Marketing emails (by our detection)
-        elif stats["marketing_score"] >= 3:
-            categories["marketing"]["senders"].append((addr, stats))
-            categories["marketing"]["email_count"] += stats["total"]
+        elif stats.marketing_score >= 3:
+            flags |= FLAG_MARKETING
         
         # Never opened (5+ emails, 0% read rate)
-        if stats["total"] >= 5 and stats["read"] == 0:
-            categories["never_opened"]["senders"].append((addr, stats))
-            categories["never_opened"]["email_count"] += stats["total"]
+        if stats.total >= 5 and stats.read == 0:
+            flags |= FLAG_NEVER_OPENED
         
         # Rarely opened (<20% read rate, 3+ emails)
-        elif stats["total"] >= 3 and stats["read_rate"] < 0.2 and stats["read_rate"] > 0:
-            categories["rarely_opened"]["senders"].append((addr, stats))
-            categories["rarely_opened"]["email_count"] += stats["total"]
+        elif stats.total >= 3 and stats.read_rate < 0.2 and stats.read_rate > 0:
+            flags |= FLAG_RARELY_OPENED
         
         # Bulk senders (20+ emails)
-        if stats["total"] >= 20:
-            categories["bulk_senders"]["senders"].append((addr, stats))
-            categories["bulk_senders"]["email_count"] += stats["total"]
+        if stats.total >= 20:
+            flags |= FLAG_BULK_SENDERS
         
-        # Old unread emails
-        old_unread_emails = []
-        for email in stats["emails"]:
-            if not email.get("isRead"):
-                # Check if older than 30 days
-                date_str = email.get("date", "")
-                if date_str:
-                    try:
-                        # Parse various date formats
-                        for fmt in ["%a, %d %b %Y %H:%M:%S %z", "%d %b %Y %H:%M:%S %z"]:
-                            try:
-                                email_date = datetime.strptime(date_str[:31], fmt)
-                                if email_date.replace(tzinfo=None) < thirty_days_ago:
-                                    old_unread_emails.append(email)
-                                break
-                            except:
-                                continue
-                    except:
-                        pass
+        # Old unread emails (30+ days; ts is 0 when the date is unknown)
+        stats.old_unread_ids = [
+            eid for eid, ts, unread in zip(stats.ids, stats.ts, stats.unread_mask)
+            if unread and 0 < ts < thirty_days_ago
+        ]
+        
+        if stats.old_unread_ids:
+            flags |= FLAG_OLD_UNREAD
         
-        if old_unread_emails:
-            old_stats = stats.copy()
-            old_stats["emails"] = old_unread_emails
-            old_stats["total"] = len(old_unread_emails)
-            categories["old_unread"]["senders"].append((addr, old_stats))
-            categories["old_unread"]["email_count"] += len(old_unread_emails)
+        stats.flags = flags
+        
+        for flag, key in CATEGORY_FLAGS:
+            if not flags & flag:
+                continue
+            
+            if flag == FLAG_OLD_UNREAD:
+                # Only the fields display and cleanup need, not a copy of the columns
+                entry = SenderStats(stats.name)
+                entry.total = entry.unread = len(stats.old_unread_ids)
+                entry.read_rate = stats.read_rate
+                entry.ids = stats.old_unread_ids
+            else:
+                entry = stats
+            
+            categories[key]["senders"].append((addr, entry))
+            categories[key]["email_count"] += entry.total
     
     # Sort each category by email count
     for cat in categories.values():
-        cat["senders"].sort(key=lambda x: x[1]["total"], reverse=True)
+        cat["senders"].sort(key=lambda x: x[1].total, reverse=True)
     
     return categories
 
@@ -431,10 +670,10 @@ def display_category(category, show_limit=15):
     displayed = []
     for i, (addr, stats) in enumerate(category["senders"][:show_limit]):
         displayed.append((addr, stats))
-        read_pct = stats["read_rate"] * 100
-        print(f"\n  {i+1}. {stats['name']}")
+        read_pct = stats.read_rate * 100
+        print(f"\n  {i+1}. {stats.name}")
         print(f"     {addr}")
-        print(f"     {stats['total']} emails | {stats['unread']} unread | {read_pct:.0f}% read rate")
+        print(f"     {stats.total} emails | {stats.unread} unread | {read_pct:.0f}% read rate")
     
     if len(category["senders"]) > show_limit:
         print(f"\n  ... and {len(category['senders']) - show_limit} more senders")
@@ -442,77 +681,79 @@ def display_category(category, show_limit=15):
     return displayed
 
 
-def delete_emails_batch(service, emails, to_trash=True):
-    """Delete a batch of emails."""
+def delete_emails_batch(service, email_ids, to_trash=True):
+    """Delete a batch of emails by ID."""
     success = 0
     failed = 0
     
-    for i, email in enumerate(emails):
+    for i in range(0, len(email_ids), MODIFY_BATCH_SIZE):
+        ids = email_ids[i:i + MODIFY_BATCH_SIZE]
+        
         try:
             if to_trash:
-                service.users().messages().trash(userId='me', id=email['id']).execute()
+                service.users().messages().batchModify(
+                    userId='me',
+                    body={'ids': ids, 'addLabelIds': ['TRASH'], 'removeLabelIds': ['INBOX']}
+                ).execute(num_retries=MAX_RETRIES)
             else:
-                service.users().messages().delete(userId='me', id=email['id']).execute()
-            
-            success += 1
+                service.users().messages().batchDelete(
+                    userId='me', body={'ids': ids}
+                ).execute(num_retries=MAX_RETRIES)
             
-            if (i + 1) % 50 == 0:
-                print(f"    Progress: {i+1}/{len(emails)} ({success} success, {failed} failed)")
+            success += len(ids)
             
-            # Rate limiting
-            if (i + 1) % 100 == 0:
-                time.sleep(1)
-                
         except Exception as e:
-            failed += 1
+            failed += len(ids)
+        
+        print(f"    Progress: {i + len(ids)}/{len(email_ids)} ({success} success, {failed} failed)")
     
     return success, failed
 
 
 def cleanup_category(service, category):
     """Clean up all emails in a category."""
-    all_emails = []
+    all_ids = []
     
     for addr, stats in category["senders"]:
-        all_emails.extend(stats["emails"])
+        all_ids.extend(stats.ids)
     
-    if not all_emails:
+    if not all_ids:
         print("No emails to clean up.")
         return 0
     
-    print(f"\nThis will move {len(all_emails)} emails to trash.")
+    print(f"\nThis will move {len(all_ids)} emails to trash.")
     confirm = input("Continue? (yes/no): ").strip().lower()
     
     if confirm != 'yes':
         print("Cancelled.")
         return 0
     
-    print(f"\nMoving {len(all_emails)} emails to trash...")
-    success, failed = delete_emails_batch(service, all_emails, to_trash=True)
+    print(f"\nMoving {len(all_ids)} emails to trash...")
+    success, failed = delete_emails_batch(service, all_ids, to_trash=True)
     print(f"\n✓ Done: {success} moved to trash, {failed} failed")
     return success
 
 
 def cleanup_selected_senders(service, senders_list):
     """Clean up emails from selected senders."""
-    all_emails = []
+    all_ids = []
     
     for addr, stats in senders_list:
-        all_emails.extend(stats["emails"])
+        all_ids.extend(stats.ids)
     
-    if not all_emails:
+    if not all_ids:
         print("No emails to clean up.")
         return 0
     
-    print(f"\nThis will move {len(all_emails)} emails to trash.")
+    print(f"\nThis will move {len(all_ids)} emails to trash.")
     confirm = input("Continue? (yes/no): ").strip().lower()
     
     if confirm != 'yes':
         print("Cancelled.")
         return 0
     
-    print(f"\nMoving {len(all_emails)} emails to trash...")
-    success, failed = delete_emails_batch(service, all_emails, to_trash=True)
+    print(f"\nMoving {len(all_ids)} emails to trash...")
+    success, failed = delete_emails_batch(service, all_ids, to_trash=True)
     print(f"\n✓ Done: {success} moved to trash, {failed} failed")
     return success
 
@@ -544,8 +785,8 @@ def interactive_menu(service, categories, sender_stats):
             break
         
         elif choice == 's':
-            total_emails = sum(s["total"] for s in sender_stats.values())
-            total_unread = sum(s["unread"] for s in sender_stats.values())
+            total_emails = sum(s.total for s in sender_stats.values())
+            total_unread = sum(s.unread for s in sender_stats.values())
             total_senders = len(sender_stats)
             
             print(f"\n📊 INBOX STATISTICS")
@@ -554,9 +795,9 @@ def interactive_menu(service, categories, sender_stats):
             print(f"   Unique senders: {total_senders}")
             print(f"\n   Top 10 senders by volume:")
             
-            top_senders = sorted(sender_stats.items(), key=lambda x: x[1]["total"], reverse=True)[:10]
+            top_senders = sorted(sender_stats.items(), key=lambda x: x[1].total, reverse=True)[:10]
             for i, (addr, stats) in enumerate(top_senders):
-                print(f"   {i+1}. {stats['name'][:30]} - {stats['total']} emails")
+                print(f"   {i+1}. {stats.name[:30]} - {stats.total} emails")
         
         elif choice == 'a':
             total_to_clean = sum(cat["email_count"] for cat in categories.values() if cat["senders"])
@@ -566,18 +807,19 @@ def interactive_menu(service, categories, sender_stats):
             confirm = input("\nType 'yes' to proceed: ").strip().lower()
             
             if confirm == 'yes':
-                all_email_ids = set()
-                all_emails = []
+                # Every email belongs to exactly one sender, so no dedup is needed:
+                # take all of a sender's emails if any full-sender category
+                # flagged it, otherwise just its old unread ones
+                all_ids = []
                 
-                for cat in categories.values():
-                    for addr, stats in cat["senders"]:
-                        for email in stats["emails"]:
-                            if email["id"] not in all_email_ids:
-                                all_email_ids.add(email["id"])
-                                all_emails.append(email)
+                for stats in sender_stats.values():
+                    if stats.flags & ~FLAG_OLD_UNREAD:
+                        all_ids.extend(stats.ids)
+                    elif stats.flags:
+                        all_ids.extend(stats.old_unread_ids)
                 
-                print(f"\nMoving {len(all_emails)} unique emails to trash...")
-                success, failed = delete_emails_batch(service, all_emails, to_trash=True)
+                print(f"\nMoving {len(all_ids)} unique emails to trash...")
+                success, failed = delete_emails_batch(service, all_ids, to_trash=True)
                 print(f"\n✓ Complete: {success} moved to trash, {failed} failed")
             else:
                 print("Cancelled.")
@@ -636,7 +878,7 @@ def main():
     """)
     
     # Authenticate
-    service = authenticate()
+    service, creds = authenticate()
     if not service:
         input("\nPress Enter to exit...")
         return
@@ -657,7 +899,7 @@ def main():
         "4": 25000
     }.get(scan_choice, 5000)
     
-    emails = fetch_emails(service, max_emails=max_emails)
+    emails = fetch_emails(service, creds, max_emails=max_emails)
     
     if not emails:
         print("\nNo emails found!")
@@ -667,6 +909,9 @@ def main():
     # Analyze
     sender_stats = analyze_emails(emails)
     
+    # Per-sender stats keep the IDs needed for cleanup, so drop the full emails
+    del emails
+    
     # Categorize
     categories = categorize_senders(sender_stats)
     
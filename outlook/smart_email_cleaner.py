@@ -16,10 +16,16 @@ SETUP:
 import msal
 import requests
 import webbrowser
-from collections import defaultdict
-from datetime import datetime, timedelta
+from array import array
+from collections import Counter, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
 import re
+import sys
 import time
+from functools import lru_cache
+from itertools import compress, islice
+from urllib.parse import parse_qsl, quote, urlencode, urlsplit, urlunsplit
 
 # Auth settings
 CLIENT_ID = "9e5f94bc-e8a4-4e73-b8be-63364c29d753"
@@ -28,6 +34,33 @@ SCOPES = ["https://graph.microsoft.com/Mail.Read",
           "https://graph.microsoft.com/Mail.ReadWrite"]
 GRAPH_ENDPOINT = "https://graph.microsoft.com/v1.0"
 
+# Graph allows at most 20 requests per $batch call
+GRAPH_BATCH_SIZE = 20
+BATCH_WORKERS = 4
+MAX_RETRIES = 5
+
+# Statuses Graph throttles with; retried after their Retry-After
+RETRY_STATUSES = (429, 503, 504)
+
+# Fields listed for every email. bodyPreview is only needed for senders the
+# other fields don't already flag as marketing, so it is normally fetched
+# afterwards for just those emails.
+MESSAGE_SELECT = "id,subject,from,receivedDateTime,isRead"
+PREVIEW_SELECT = MESSAGE_SELECT + ",bodyPreview"
+
+# If more than this share of the first page is still undecided, bodyPreview
+# is listed for the rest of the scan instead. Listing it adds ~300 bytes per
+# email; refetching one email is a $batch sub-request and response of ~1.3KB
+# (ID in the URL, response headers, repeated subject/from), so listing wins
+# above roughly a fifth, before counting round trips and per-mailbox throttling.
+PREVIEW_REFETCH_MAX_SHARE = 0.2
+
+# Starting value for a sender's oldest timestamp, above any real date
+TS_MAX = 2**63 - 1
+
+# One keep-alive connection pool for every Graph call
+SESSION = requests.Session()
+
 # Marketing/spam indicators
 MARKETING_KEYWORDS = [
     'unsubscribe', 'opt-out', 'opt out', 'email preferences', 'manage preferences',
@@ -44,7 +77,7 @@ MARKETING_SENDER_PATTERNS = [
     'notifications@', 'alert@', 'mailer', 'campaign', 'bulk', 'mass'
 ]
 
-KNOWN_MARKETING_DOMAINS = [
+KNOWN_MARKETING_DOMAINS = frozenset([
     'linkedin.com', 'facebookmail.com', 'twitter.com', 'pinterest.com',
     'quora.com', 'medium.com', 'substack.com', 'mailchimp.com', 
     'sendgrid.net', 'amazonses.com', 'constantcontact.com',
@@ -54,7 +87,41 @@ KNOWN_MARKETING_DOMAINS = [
     'spotify.com', 'netflix.com', 'hulu.com', 'discord.com',
     'uber.com', 'lyft.com', 'doordash.com', 'grubhub.com',
     'yelp.com', 'tripadvisor.com', 'booking.com', 'expedia.com'
-]
+])
+
+# Subdomains of the known domains (e.g. mail.linkedin.com)
+_DOMAIN_SUFFIXES = tuple('.' + d for d in KNOWN_MARKETING_DOMAINS)
+
+
+def _trie_regex(words):
+    """Build a regex matching any of `words`, nested as a prefix trie.
+    
+    Shared prefixes are matched once instead of once per word, and the
+    longest word wins when one word is a prefix of another.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+    
+    def emit(node):
+        alts = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ''
+        body = alts[0] if len(alts) == 1 else '(?:' + '|'.join(alts) + ')'
+        return '(?:' + body + ')?' if '' in node else body
+    
+    return emit(trie)
+
+
+_SENDER_PATTERN_RE = re.compile(_trie_regex(MARKETING_SENDER_PATTERNS))
+
+# All keywords in one pattern so each email's text is scanned once. The
+# lookahead lets matches overlap, so every keyword present is reported,
+# including 'unsubscribe', which the scorers test for in the match set.
+_KEYWORD_RE = re.compile('(?=(' + _trie_regex(MARKETING_KEYWORDS) + '))')
 
 
 def authenticate():
@@ -100,14 +167,52 @@ def get_headers(token):
     return {"Authorization": f"Bearer {token}"}
 
 
-def fetch_all_emails(token, max_emails=5000, include_read=True):
-    """Fetch emails from inbox."""
+def _fetch_page(url, headers, params=None):
+    """Fetch and decode one page of messages, retrying on throttling and errors."""
+    while True:
+        try:
+            response = SESSION.get(url, headers=headers, params=params, timeout=30)
+            
+            if response.status_code == 429:  # Rate limited
+                print("  Rate limited, waiting 30 seconds...")
+                time.sleep(30)
+                continue
+            
+            if response.status_code != 200:
+                print(f"  Error {response.status_code}")
+                return None
+            
+            return response.json()
+            
+        except Exception as e:
+            print(f"  Error: {e}")
+            time.sleep(5)
+
+
+def _with_preview(url):
+    """Rewrite a nextLink so the pages after it also list bodyPreview."""
+    parts = urlsplit(url)
+    query = [(k, PREVIEW_SELECT if k == "$select" else v)
+             for k, v in parse_qsl(parts.query, keep_blank_values=True)]
+    return urlunsplit(parts._replace(query=urlencode(query, safe="$,'()", quote_via=quote)))
+
+
+def iter_emails(token, max_emails=5000, include_read=True):
+    """Fetch emails from inbox, yielding one page of results at a time.
+    
+    From the second page on, the next page is requested in a background
+    thread while the caller processes the current one. The second page waits
+    for the caller's answer to the first: sending True into the generator
+    adds bodyPreview to every later page.
+    """
     headers = get_headers(token)
-    emails = []
+    fetched = 0
+    page_count = 0
+    with_preview = False
     
     url = f"{GRAPH_ENDPOINT}/me/mailFolders/inbox/messages"
     params = {
-        "$select": "id,subject,from,receivedDateTime,isRead,bodyPreview",
+        "$select": MESSAGE_SELECT,
         "$orderby": "receivedDateTime desc",
         "$top": 100
     }
@@ -115,70 +220,201 @@ def fetch_all_emails(token, max_emails=5000, include_read=True):
     print(f"\nFetching emails (up to {max_emails})...")
     start_time = time.time()
     
-    while url and len(emails) < max_emails:
-        try:
-            response = requests.get(url, headers=headers, params=params, timeout=30)
+    with ThreadPoolExecutor(max_workers=1) as prefetch:
+        data = _fetch_page(url, headers, params)
+        
+        while data is not None:
+            batch = data.get("value", [])
+            fetched += len(batch)
+            page_count += 1
             
-            if response.status_code == 429:  # Rate limited
-                print("  Rate limited, waiting 30 seconds...")
-                time.sleep(30)
-                continue
+            url = data.get("@odata.nextLink") if fetched < max_emails else None
+            if url and with_preview:
+                url = _with_preview(url)
             
-            if response.status_code != 200:
-                print(f"  Error {response.status_code}")
-                break
+            # Start on the next page before handing this one over
+            pending = prefetch.submit(_fetch_page, url, headers) if url and page_count > 1 else None
             
-            data = response.json()
-            batch = data.get("value", [])
-            emails.extend(batch)
+            # Progress every 5 pages (500 emails at $top=100)
+            if page_count % 5 == 0:
+                elapsed = time.time() - start_time
+                print(f"  {fetched} emails fetched... ({elapsed:.0f}s)")
             
-            url = data.get("@odata.nextLink")
-            params = None
+            if (yield batch):
+                with_preview = True
             
-            if len(emails) % 500 == 0:
-                elapsed = time.time() - start_time
-                print(f"  {len(emails)} emails fetched... ({elapsed:.0f}s)")
-                
-        except Exception as e:
-            print(f"  Error: {e}")
-            time.sleep(5)
-            continue
+            if url and pending is None:
+                pending = prefetch.submit(_fetch_page, _with_preview(url) if with_preview else url, headers)
+            
+            data = pending.result() if pending else None
     
     elapsed = time.time() - start_time
-    print(f"✓ Fetched {len(emails)} emails in {elapsed:.0f} seconds")
-    return emails
+    print(f"✓ Fetched {fetched} emails in {elapsed:.0f} seconds")
 
 
-def is_marketing_email(email):
-    """Check if email appears to be marketing/promotional."""
-    subject = (email.get("subject") or "").lower()
-    body_preview = (email.get("bodyPreview") or "").lower()
-    sender_email = email.get("from", {}).get("emailAddress", {}).get("address", "").lower()
-    sender_name = email.get("from", {}).get("emailAddress", {}).get("name", "").lower()
+def _retry_after(headers, default):
+    """Seconds to wait from a Retry-After header, or `default` if missing or unparsable."""
+    try:
+        return int(headers.get("Retry-After", default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _send_batch(headers, batch_requests):
+    """Send up to GRAPH_BATCH_SIZE requests as one $batch call.
+    
+    Throttled requests (429/503/504) are resent after their Retry-After.
+    Returns the responses keyed by request id; requests that never succeeded
+    are missing.
+    """
+    pending = {req["id"]: req for req in batch_requests}
+    responses = {}
+    
+    for attempt in range(MAX_RETRIES):
+        try:
+            r = SESSION.post(f"{GRAPH_ENDPOINT}/$batch", headers=headers,
+                             json={"requests": list(pending.values())}, timeout=30)
+        except Exception:
+            time.sleep(2 ** attempt)
+            continue
+        
+        if r.status_code in RETRY_STATUSES:  # Whole batch throttled
+            time.sleep(_retry_after(r.headers, 2 ** attempt))
+            continue
+        
+        if r.status_code != 200:
+            break
+        
+        # Keep only the throttled sub-requests for the next attempt
+        retry_after = 0
+        throttled = {}
+        try:
+            for resp in r.json().get("responses", []):
+                if resp["status"] in RETRY_STATUSES:
+                    throttled[resp["id"]] = pending[resp["id"]]
+                    retry_after = max(retry_after, _retry_after(resp.get("headers") or {}, 1))
+                else:
+                    responses[resp["id"]] = resp
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            print(f"  Unreadable $batch response: {e}")
+            break
+        
+        pending = throttled
+        if not pending:
+            break
+        time.sleep(retry_after)
+    
+    return responses
+
+
+def fetch_previews(token, email_ids):
+    """Fetch subject, sender and bodyPreview for the given emails via $batch GETs.
+    
+    Returns a dict of position in email_ids -> message. Emails whose request
+    failed or stayed throttled are missing from it.
+    """
+    headers = get_headers(token)
+    headers["Content-Type"] = "application/json"
+    
+    chunks = []
+    for start in range(0, len(email_ids), GRAPH_BATCH_SIZE):
+        chunks.append([
+            {"id": str(n), "method": "GET",
+             "url": f"/me/messages/{email_ids[n]}?$select=subject,from,bodyPreview"}
+            for n in range(start, min(start + GRAPH_BATCH_SIZE, len(email_ids)))
+        ])
+    
+    messages = {}
+    with ThreadPoolExecutor(max_workers=BATCH_WORKERS) as pool:
+        for responses in pool.map(lambda chunk: _send_batch(headers, chunk), chunks):
+            for rid, resp in responses.items():
+                if resp["status"] == 200:
+                    messages[int(rid)] = resp["body"]
+    
+    return messages
+
+
+@lru_cache(maxsize=4096)
+def _sender_score(sender_email, sender_name):
+    """Score the sender-based marketing signals (patterns and domains).
+    
+    Cached, since a sender's score is the same for every email they send.
+    """
+    sender_email = sender_email.lower()
+    sender_name = sender_name.lower()
     
     score = 0
     reasons = []
     
     # Check sender patterns
-    for pattern in MARKETING_SENDER_PATTERNS:
-        if pattern in sender_email or pattern in sender_name:
-            score += 2
-            reasons.append(f"sender pattern: {pattern}")
-            break
+    match = _SENDER_PATTERN_RE.search(sender_email) or _SENDER_PATTERN_RE.search(sender_name)
+    if match:
+        score += 2
+        reasons.append(f"sender pattern: {match.group(0)}")
     
-    # Check known marketing domains
-    for domain in KNOWN_MARKETING_DOMAINS:
-        if domain in sender_email:
-            score += 3
-            reasons.append(f"known marketing domain: {domain}")
-            break
+    # Check known marketing domains (the sender's domain or a parent of it)
+    domain = sender_email.rsplit('@', 1)[-1]
+    if domain.endswith(_DOMAIN_SUFFIXES):
+        domain = next(d for d in KNOWN_MARKETING_DOMAINS if domain.endswith('.' + d))
+    if domain in KNOWN_MARKETING_DOMAINS:
+        score += 3
+        reasons.append(f"known marketing domain: {domain}")
+    
+    return score, tuple(reasons)
+
+
+def _email_text(email):
+    """Subject and body preview, lowercased in one call."""
+    return ((email.get("subject") or "") + " " + (email.get("bodyPreview") or "")).lower()
+
+
+def _text_score(text):
+    """Score the keyword signals of an email's lowercased subject/body text."""
+    matched = set(_KEYWORD_RE.findall(text))
+    score = 0
+    if len(matched) >= 3:
+        score += 4
+    elif matched:
+        score += 2
+    
+    if 'unsubscribe' in matched:
+        score += 3
+    
+    return score
+
+
+@lru_cache(maxsize=4096)
+def _subject_score(text):
+    """_text_score for an email listed without bodyPreview.
+    
+    Cached, since the text is then just the subject, and newsletters and
+    notifications repeat the same subjects. Text with a body preview is
+    almost always unique, so it is not cached.
+    """
+    return _text_score(text)
+
+
+def _score_only(text, sender_email, sender_name, subject_only=False):
+    """Marketing score of an email, without building the explanation.
+    
+    `text` comes from _email_text and `sender_email` is already lowercased,
+    so the scan works on strings made once at ingest.
+    """
+    text_score = _subject_score(text) if subject_only else _text_score(text)
+    return _sender_score(sender_email, sender_name)[0] + text_score
+
+
+def is_marketing_email(email):
+    """Check if email appears to be marketing/promotional."""
+    sender = email.get("from", {}).get("emailAddress", {})
+    
+    score, sender_reasons = _sender_score(sender.get("address", ""), sender.get("name", ""))
+    reasons = list(sender_reasons)
     
     # Check for marketing keywords in subject/body
-    text = subject + " " + body_preview
-    keyword_matches = 0
-    for keyword in MARKETING_KEYWORDS:
-        if keyword in text:
-            keyword_matches += 1
+    text = _email_text(email)
+    matched = set(_KEYWORD_RE.findall(text))
+    keyword_matches = len(matched)
     
     if keyword_matches >= 3:
         score += 4
@@ -187,64 +423,185 @@ def is_marketing_email(email):
         score += 2
         reasons.append(f"{keyword_matches} marketing keyword(s)")
     
-    # Check for unsubscribe (strong indicator)
-    if 'unsubscribe' in text:
+    # Check for unsubscribe (strong indicator), found by the same scan
+    if 'unsubscribe' in matched:
         score += 3
         reasons.append("contains 'unsubscribe'")
     
     return score >= 3, score, reasons
 
 
-def analyze_emails(emails):
-    """Analyze all emails and categorize them."""
-    print("\nAnalyzing emails...")
+class SenderStats:
+    """Counters for one sender, plus the indices of its emails in the columns."""
+    
+    __slots__ = (
+        'name', 'total', 'unread', 'read', 'read_rate', 'marketing_score',
+        'oldest', 'newest', 'columns', 'email_idx', 'old_unread_idx'
+    )
+    
+    def __init__(self, name=""):
+        self.name = name
+        self.total = 0
+        self.unread = 0
+        self.read = 0
+        self.read_rate = 0.0
+        self.marketing_score = 0
+        self.oldest = TS_MAX  # stays TS_MAX / 0 if no email has a date
+        self.newest = 0
+        self.columns = None
+        self.email_idx = array('l')
+        self.old_unread_idx = array('l')
+    
+    def ids(self):
+        """Message IDs of this sender's emails."""
+        ids = self.columns["ids"]
+        return [ids[i] for i in self.email_idx]
+
+
+class OldUnreadView(namedtuple('OldUnreadView', 'name total unread read_rate columns email_idx')):
+    """A sender's old unread emails, with just the fields the menu displays."""
+    
+    __slots__ = ()
+    ids = SenderStats.ids
+
+
+def build_columns(pages):
+    """Score emails page by page into columns, with senders interned to indices.
+    
+    `pages` is the iter_emails generator. Only the id, timestamp and read flag
+    are kept per email; the rest of the payload is dropped once it has been
+    scored. If more than PREVIEW_REFETCH_MAX_SHARE of the first page is
+    undecided, the generator is asked to list bodyPreview for the rest of the scan.
+    """
+    sender_index = {}
+    columns = {
+        "ids": [],                  # per email: message ID
+        "addrs": [],                # address of each sender index
+        "names": [],                # display name of each sender index
+        "sender_idx": array('l'),   # per email: sender index
+        "ts": array('q'),           # per email: epoch seconds (0 if unknown)
+        "is_read": bytearray(),     # per email: 1 if read
+        "max_score": [],            # highest score of each sender index
+        "preview_from": None        # first email listed with bodyPreview
+    }
+    max_score = columns["max_score"]
     
-    sender_stats = defaultdict(lambda: {
-        "total": 0,
-        "unread": 0,
-        "read": 0,
-        "marketing_score": 0,
-        "emails": [],
-        "name": "",
-        "oldest": None,
-        "newest": None,
-        "read_rate": 0
-    })
-    
-    now = datetime.utcnow()
-    
-    for email in emails:
-        sender = email.get("from", {}).get("emailAddress", {})
-        addr = sender.get("address", "unknown").lower()
-        name = sender.get("name", addr)
-        is_read = email.get("isRead", False)
-        received = email.get("receivedDateTime", "")
-        
-        # Check if marketing
-        is_marketing, marketing_score, _ = is_marketing_email(email)
+    want_preview = None
+    first_page = True
+    while True:
+        try:
+            page = pages.send(want_preview)
+        except StopIteration:
+            break
+        want_preview = None
         
-        stats = sender_stats[addr]
-        stats["total"] += 1
-        stats["name"] = name
-        stats["emails"].append(email)
-        stats["marketing_score"] = max(stats["marketing_score"], marketing_score)
+        if page and columns["preview_from"] is None and "bodyPreview" in page[0]:
+            columns["preview_from"] = len(columns["ids"])
         
-        if is_read:
-            stats["read"] += 1
-        else:
-            stats["unread"] += 1
+        for email in page:
+            sender = email.get("from", {}).get("emailAddress", {})
+            addr = sys.intern(sender.get("address", "unknown").lower())
+            idx = sender_index.get(addr)
+            if idx is None:
+                idx = sender_index[addr] = len(columns["addrs"])
+                columns["addrs"].append(addr)
+                columns["names"].append("")
+                max_score.append(0)
+            columns["names"][idx] = sender.get("name", addr)
+            
+            # Parse the timestamp once; later comparisons are plain ints
+            received = email.get("receivedDateTime", "")
+            try:
+                ts = int(datetime.fromisoformat(received.replace("Z", "+00:00")).timestamp()) if received else 0
+            except ValueError:
+                ts = 0
+            is_read = bool(email.get("isRead", False))
+            
+            columns["ids"].append(email["id"])
+            columns["sender_idx"].append(idx)
+            columns["ts"].append(ts)
+            columns["is_read"].append(is_read)
+            score = _score_only(_email_text(email), addr, sender.get("name", ""),
+                                subject_only="bodyPreview" not in email)
+            if score > max_score[idx]:
+                max_score[idx] = score
         
-        # Track dates
-        if received:
-            if not stats["oldest"] or received < stats["oldest"]:
-                stats["oldest"] = received
-            if not stats["newest"] or received > stats["newest"]:
-                stats["newest"] = received
-    
-    # Calculate read rates
-    for addr, stats in sender_stats.items():
-        if stats["total"] > 0:
-            stats["read_rate"] = stats["read"] / stats["total"]
+        if first_page:
+            first_page = False
+            undecided = sum(1 for i in columns["sender_idx"] if max_score[i] < 3)
+            if undecided > len(columns["ids"]) * PREVIEW_REFETCH_MAX_SHARE:
+                print(f"  {undecided} of the first {len(columns['ids'])} emails need a body preview; "
+                      f"listing previews from here on")
+                want_preview = True
+    
+    return columns
+
+
+def analyze_emails(token, pages):
+    """Analyze emails as pages arrive from iter_emails."""
+    columns = build_columns(pages)
+    print("\nAnalyzing emails...")
+    
+    sender_idx = columns["sender_idx"]
+    n_senders = len(columns["addrs"])
+    max_scores = columns["max_score"]
+    
+    # Emails listed without bodyPreview were scored on subject and sender.
+    # The body can only add to a score, so it is fetched just for senders
+    # not already flagged as marketing.
+    preview_from = columns["preview_from"]
+    if preview_from is None:
+        preview_from = len(sender_idx)
+    undecided = [n for n in range(preview_from) if max_scores[sender_idx[n]] < 3]
+    if undecided:
+        print(f"  Fetching previews for {len(undecided)} undecided emails...")
+        ids = columns["ids"]
+        previews = fetch_previews(token, [ids[n] for n in undecided])
+        missing = len(undecided) - len(previews)
+        if missing:
+            print(f"  ⚠ {missing} previews could not be fetched; those emails were scored "
+                  f"on subject and sender only")
+        for pos, message in previews.items():
+            n = undecided[pos]
+            sender = message.get("from", {}).get("emailAddress", {})
+            score = _score_only(_email_text(message), sender.get("address", "").lower(),
+                                sender.get("name", ""))
+            if score > max_scores[sender_idx[n]]:
+                max_scores[sender_idx[n]] = score
+    
+    # Per-sender aggregates over the columns
+    totals = Counter(sender_idx)
+    reads = Counter(compress(sender_idx, columns["is_read"]))
+    oldest = [TS_MAX] * n_senders
+    newest = [0] * n_senders
+    idx_by_sender = [array('l') for _ in range(n_senders)]
+    old_unread_by_sender = [array('l') for _ in range(n_senders)]
+    thirty_days_ago = int((datetime.now(timezone.utc) - timedelta(days=30)).timestamp())
+    
+    for n, (i, ts, is_read) in enumerate(zip(sender_idx, columns["ts"], columns["is_read"])):
+        idx_by_sender[i].append(n)
+        # Unread and older than 30 days (ts is 0 when the date is unknown)
+        if not is_read and 0 < ts < thirty_days_ago:
+            old_unread_by_sender[i].append(n)
+        if 0 < ts < oldest[i]:
+            oldest[i] = ts
+        if ts > newest[i]:
+            newest[i] = ts
+    
+    # One SenderStats per sender, used for categorizing and display
+    sender_stats = {}
+    for i, addr in enumerate(columns["addrs"]):
+        stats = sender_stats[addr] = SenderStats(columns["names"][i])
+        stats.total = totals[i]
+        stats.read = reads[i]
+        stats.unread = stats.total - stats.read
+        stats.read_rate = stats.read / stats.total
+        stats.marketing_score = max_scores[i]
+        stats.oldest = oldest[i]
+        stats.newest = newest[i]
+        stats.columns = columns
+        stats.email_idx = idx_by_sender[i]
+        stats.old_unread_idx = old_unread_by_sender[i]
     
     return sender_stats
 
@@ -285,53 +642,38 @@ def categorize_senders(sender_stats):
         }
     }
     
-    now = datetime.utcnow()
-    thirty_days_ago = now - timedelta(days=30)
-    
     for addr, stats in sender_stats.items():
         # Marketing emails
-        if stats["marketing_score"] >= 3:
+        if stats.marketing_score >= 3:
             categories["marketing"]["senders"].append((addr, stats))
-            categories["marketing"]["email_count"] += stats["total"]
+            categories["marketing"]["email_count"] += stats.total
         
         # Never opened (5+ emails, 0% read rate)
-        if stats["total"] >= 5 and stats["read"] == 0:
+        if stats.total >= 5 and stats.read == 0:
             categories["never_opened"]["senders"].append((addr, stats))
-            categories["never_opened"]["email_count"] += stats["total"]
+            categories["never_opened"]["email_count"] += stats.total
         
         # Rarely opened (<20% read rate, 3+ emails)
-        elif stats["total"] >= 3 and stats["read_rate"] < 0.2 and stats["read_rate"] > 0:
+        elif stats.total >= 3 and stats.read_rate < 0.2 and stats.read_rate > 0:
             categories["rarely_opened"]["senders"].append((addr, stats))
-            categories["rarely_opened"]["email_count"] += stats["total"]
+            categories["rarely_opened"]["email_count"] += stats.total
         
         # Bulk senders (20+ emails)
-        if stats["total"] >= 20:
+        if stats.total >= 20:
             categories["bulk_senders"]["senders"].append((addr, stats))
-            categories["bulk_senders"]["email_count"] += stats["total"]
-        
-        # Old unread emails
-        old_unread_emails = []
-        for email in stats["emails"]:
-            if not email.get("isRead"):
-                received = email.get("receivedDateTime", "")
-                if received:
-                    try:
-                        received_date = datetime.fromisoformat(received.replace("Z", "+00:00"))
-                        if received_date.replace(tzinfo=None) < thirty_days_ago:
-                            old_unread_emails.append(email)
-                    except:
-                        pass
+            categories["bulk_senders"]["email_count"] += stats.total
         
-        if old_unread_emails:
-            old_stats = stats.copy()
-            old_stats["emails"] = old_unread_emails
-            old_stats["total"] = len(old_unread_emails)
+        # Old unread emails (collected during analysis)
+        old_unread = len(stats.old_unread_idx)
+        if old_unread:
+            old_stats = OldUnreadView(stats.name, old_unread, old_unread,
+                                      stats.read_rate, stats.columns, stats.old_unread_idx)
             categories["old_unread"]["senders"].append((addr, old_stats))
-            categories["old_unread"]["email_count"] += len(old_unread_emails)
+            categories["old_unread"]["email_count"] += old_unread
     
     # Sort each category by email count
     for cat in categories.values():
-        cat["senders"].sort(key=lambda x: x[1]["total"], reverse=True)
+        cat["senders"].sort(key=lambda x: x[1].total, reverse=True)
     
     return categories
 
@@ -351,10 +693,10 @@ def display_category(category, show_limit=15):
     displayed = []
     for i, (addr, stats) in enumerate(category["senders"][:show_limit]):
         displayed.append((addr, stats))
-        read_pct = stats["read_rate"] * 100
-        print(f"\n  {i+1}. {stats['name']}")
+        read_pct = stats.read_rate * 100
+        print(f"\n  {i+1}. {stats.name}")
         print(f"     {addr}")
-        print(f"     {stats['total']} emails | {stats['unread']} unread | {read_pct:.0f}% read rate")
+        print(f"     {stats.total} emails | {stats.unread} unread | {read_pct:.0f}% read rate")
     
     if len(category["senders"]) > show_limit:
         print(f"\n  ... and {len(category['senders']) - show_limit} more senders")
@@ -362,92 +704,104 @@ def display_category(category, show_limit=15):
     return displayed
 
 
-def delete_emails_batch(token, emails, to_trash=True):
-    """Delete a batch of emails."""
+def _post_batch(headers, eids, to_trash):
+    """Move or delete up to GRAPH_BATCH_SIZE emails with one $batch call."""
+    batch_requests = []
+    for i, eid in enumerate(eids):
+        if to_trash:
+            batch_requests.append({
+                "id": str(i),
+                "method": "POST",
+                "url": f"/me/messages/{eid}/move",
+                "body": {"destinationId": "deleteditems"},
+                "headers": {"Content-Type": "application/json"}
+            })
+        else:
+            batch_requests.append({"id": str(i), "method": "DELETE", "url": f"/me/messages/{eid}"})
+    
+    ok_status = 201 if to_trash else 204
+    responses = _send_batch(headers, batch_requests)
+    success = sum(1 for resp in responses.values() if resp["status"] == ok_status)
+    
+    return success, len(eids) - success
+
+
+def delete_emails_batch(token, email_ids, total, to_trash=True):
+    """Delete emails, given an iterable of `total` message IDs, using Graph $batch requests.
+    
+    IDs are read from the iterable only as batches are sent, with at most
+    two batches per worker waiting, so the full ID list is never built.
+    """
     headers = get_headers(token)
     headers["Content-Type"] = "application/json"
     
+    ids = iter(email_ids)
+    in_flight = set()
+    
     success = 0
     failed = 0
-    
-    for i, email in enumerate(emails):
-        eid = email["id"]
-        
-        try:
-            if to_trash:
-                url = f"{GRAPH_ENDPOINT}/me/messages/{eid}/move"
-                r = requests.post(url, headers=headers, json={"destinationId": "deleteditems"}, timeout=10)
-                ok = r.status_code == 201
-            else:
-                url = f"{GRAPH_ENDPOINT}/me/messages/{eid}"
-                r = requests.delete(url, headers=headers, timeout=10)
-                ok = r.status_code == 204
+    done = 0
+    
+    with ThreadPoolExecutor(max_workers=BATCH_WORKERS) as pool:
+        while True:
+            while len(in_flight) < BATCH_WORKERS * 2:
+                chunk = list(islice(ids, GRAPH_BATCH_SIZE))
+                if not chunk:
+                    break
+                in_flight.add(pool.submit(_post_batch, headers, chunk, to_trash))
             
-            if ok:
-                success += 1
-            else:
-                failed += 1
-                
-            # Progress update
-            if (i + 1) % 50 == 0:
-                print(f"    Progress: {i+1}/{len(emails)} ({success} success, {failed} failed)")
-                
-            # Rate limiting
-            if (i + 1) % 100 == 0:
-                time.sleep(1)
+            if not in_flight:
+                break
+            
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                ok, bad = future.result()
+                success += ok
+                failed += bad
+                done += 1
                 
-        except Exception as e:
-            failed += 1
+                # Progress update
+                if done % 5 == 0 or success + failed == total:
+                    print(f"    Progress: {success + failed}/{total} ({success} success, {failed} failed)")
     
     return success, failed
 
 
-def cleanup_category(token, category, sender_stats):
-    """Clean up all emails in a category."""
-    all_emails = []
-    
-    for addr, stats in category["senders"]:
-        all_emails.extend(stats["emails"])
-    
-    if not all_emails:
+def _iter_ids(senders):
+    """Yield the message IDs of every (addr, stats) pair in senders."""
+    for _, stats in senders:
+        yield from stats.ids()
+
+
+def _confirm_and_delete(token, count, ids_iter):
+    """Ask for confirmation, then move the given emails to trash."""
+    if not count:
         print("No emails to clean up.")
         return 0
     
-    print(f"\nThis will move {len(all_emails)} emails to trash.")
+    print(f"\nThis will move {count} emails to trash.")
     confirm = input("Continue? (yes/no): ").strip().lower()
     
     if confirm != 'yes':
         print("Cancelled.")
         return 0
     
-    print(f"\nMoving {len(all_emails)} emails to trash...")
-    success, failed = delete_emails_batch(token, all_emails, to_trash=True)
+    print(f"\nMoving {count} emails to trash...")
+    success, failed = delete_emails_batch(token, ids_iter, count, to_trash=True)
     print(f"\n✓ Done: {success} moved to trash, {failed} failed")
     return success
 
 
+def cleanup_category(token, category, sender_stats):
+    """Clean up all emails in a category."""
+    count = sum(stats.total for _, stats in category["senders"])
+    return _confirm_and_delete(token, count, _iter_ids(category["senders"]))
+
+
 def cleanup_selected_senders(token, senders_list):
     """Clean up emails from selected senders."""
-    all_emails = []
-    
-    for addr, stats in senders_list:
-        all_emails.extend(stats["emails"])
-    
-    if not all_emails:
-        print("No emails to clean up.")
-        return 0
-    
-    print(f"\nThis will move {len(all_emails)} emails to trash.")
-    confirm = input("Continue? (yes/no): ").strip().lower()
-    
-    if confirm != 'yes':
-        print("Cancelled.")
-        return 0
-    
-    print(f"\nMoving {len(all_emails)} emails to trash...")
-    success, failed = delete_emails_batch(token, all_emails, to_trash=True)
-    print(f"\n✓ Done: {success} moved to trash, {failed} failed")
-    return success
+    count = sum(stats.total for _, stats in senders_list)
+    return _confirm_and_delete(token, count, _iter_ids(senders_list))
 
 
 def interactive_menu(token, categories, sender_stats):
@@ -478,8 +832,8 @@ def interactive_menu(token, categories, sender_stats):
         
         elif choice == 's':
             # Show statistics
-            total_emails = sum(s["total"] for s in sender_stats.values())
-            total_unread = sum(s["unread"] for s in sender_stats.values())
+            total_emails = sum(s.total for s in sender_stats.values())
+            total_unread = sum(s.unread for s in sender_stats.values())
             total_senders = len(sender_stats)
             
             print(f"\n📊 INBOX STATISTICS")
@@ -488,9 +842,9 @@ def interactive_menu(token, categories, sender_stats):
             print(f"   Unique senders: {total_senders}")
             print(f"\n   Top 10 senders by volume:")
             
-            top_senders = sorted(sender_stats.items(), key=lambda x: x[1]["total"], reverse=True)[:10]
+            top_senders = sorted(sender_stats.items(), key=lambda x: x[1].total, reverse=True)[:10]
             for i, (addr, stats) in enumerate(top_senders):
-                print(f"   {i+1}. {stats['name'][:30]} - {stats['total']} emails")
+                print(f"   {i+1}. {stats.name[:30]} - {stats.total} emails")
         
         elif choice == 'a':
             # Auto-clean all
@@ -501,18 +855,11 @@ def interactive_menu(token, categories, sender_stats):
             confirm = input("\nType 'yes' to proceed: ").strip().lower()
             
             if confirm == 'yes':
-                all_email_ids = set()
-                all_emails = []
+                # Senders can appear in several categories; the set drops repeats
+                unique_ids = set().union(*(_iter_ids(cat["senders"]) for cat in categories.values()))
                 
-                for cat in categories.values():
-                    for addr, stats in cat["senders"]:
-                        for email in stats["emails"]:
-                            if email["id"] not in all_email_ids:
-                                all_email_ids.add(email["id"])
-                                all_emails.append(email)
-                
-                print(f"\nMoving {len(all_emails)} unique emails to trash...")
-                success, failed = delete_emails_batch(token, all_emails, to_trash=True)
+                print(f"\nMoving {len(unique_ids)} unique emails to trash...")
+                success, failed = delete_emails_batch(token, unique_ids, len(unique_ids), to_trash=True)
                 print(f"\n✓ Complete: {success} moved to trash, {failed} failed")
             else:
                 print("Cancelled.")
@@ -593,16 +940,14 @@ def main():
         "4": 50000
     }.get(scan_choice, 5000)
     
-    emails = fetch_all_emails(token, max_emails=max_emails)
+    # Fetch and analyze in one pass
+    sender_stats = analyze_emails(token, iter_emails(token, max_emails=max_emails))
     
-    if not emails:
+    if not sender_stats:
         print("\nNo emails found!")
         input("\nPress Enter to exit...")
         return
     
-    # Analyze
-    sender_stats = analyze_emails(emails)
-    
     # Categorize
     categories = categorize_senders(sender_stats)
     